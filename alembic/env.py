@@ -9,10 +9,10 @@ from alembic import context
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
-from app.core.config import config as app_core_config
+from app.core.config import get_config
 
 config = context.config
-config.set_main_option("sqlalchemy.url", str(app_core_config.sqlalchemy_database_url))
+config.set_main_option("sqlalchemy.url", str(get_config().sqlalchemy_database_url))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,28 @@
+"""review created_at server default
+
+Revision ID: 88d7164109eb
+Revises: 504818aef243
+Create Date: 2026-10-14 08:51:22.717356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '88d7164109eb'
+down_revision: Union[str, Sequence[str], None] = '504818aef243'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('reviews', 'created_at', server_default=sa.text('now()'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('reviews', 'created_at', server_default=None)
@@ -0,0 +1,52 @@
+"""store user roles as smallint
+
+Revision ID: c60c3076a057
+Revises: 88d7164109eb
+Create Date: 2026-10-14 08:54:11.146510
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c60c3076a057'
+down_revision: Union[str, Sequence[str], None] = '88d7164109eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+userrole = sa.Enum('admin', 'seller', 'buyer', name='userrole')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column(
+        'users',
+        'role',
+        existing_type=userrole,
+        type_=sa.SmallInteger(),
+        existing_nullable=False,
+        postgresql_using=(
+            "CASE role WHEN 'buyer' THEN 1 WHEN 'seller' THEN 2 WHEN 'admin' THEN 3 END"
+        ),
+    )
+    userrole.drop(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    userrole.create(op.get_bind())
+    op.alter_column(
+        'users',
+        'role',
+        existing_type=sa.SmallInteger(),
+        type_=userrole,
+        existing_nullable=False,
+        postgresql_using=(
+            "(CASE role WHEN 1 THEN 'buyer' WHEN 2 THEN 'seller' WHEN 3 THEN 'admin' END)"
+            "::userrole"
+        ),
+    )
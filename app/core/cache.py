@@ -0,0 +1,44 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache[K, V]:
+    """
+    Small in-process LRU cache whose entries expire `ttl` seconds after being set.
+    Each worker process keeps its own copy, so keep `ttl` short for mutable data.
+    """
+
+    def __init__(self, *, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        # Evict the least recently used entry once we grow past the limit.
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def add(self, key: K, value: V) -> None:
+        # Unlike `set`, keep a live entry that was written while the caller was
+        # still fetching `value`, since that entry is the newer one.
+        if self.get(key) is None:
+            self.set(key, value)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
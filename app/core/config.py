@@ -1,4 +1,5 @@
 import re
+from functools import cached_property, lru_cache
 from typing import Annotated
 
 from pydantic import (
@@ -9,14 +10,23 @@ from pydantic import (
     SecretStr,
     UrlConstraints,
     computed_field,
+    field_validator,
 )
 from pydantic_core import MultiHostUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# libpq-style DSN fragments and their asyncpg replacements, rewritten in one pass.
+_DSN_RE = re.compile(r"^postgresql:|sslmode=require|[?&]channel_binding=[^&]*")
+_DSN_REPLACEMENTS = {
+    "postgresql:": "postgresql+asyncpg:",
+    "sslmode=require": "ssl=require",
+}
+_CORS_SPLIT_RE = re.compile(r"\s*,\s*")
+
 
 def parse_cors(v: str | list[str] | None) -> list[str] | str:
     if isinstance(v, str) and not v.startswith("["):
-        return [i.strip() for i in v.split(",") if i.strip()]
+        return [origin for origin in _CORS_SPLIT_RE.split(v.strip()) if origin]
     if isinstance(v, list | str):
         return v
 
@@ -24,26 +34,35 @@ def parse_cors(v: str | list[str] | None) -> list[str] | str:
 
 
 class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", frozen=True
+    )
+
+    # App
+    debug: bool = False
 
     # Database
     database_url: Annotated[
         MultiHostUrl,
         UrlConstraints(allowed_schemes=["postgresql"]),
     ]
+    database_pool_size: int = 25
+    database_max_overflow: int = 25
+    # 0 turns off statement caching and gives every prepared statement a unique
+    # name, as needed behind a transaction-pooling PgBouncer.
+    database_prepared_statement_cache_size: int = 1200
 
     @computed_field
-    @property
+    @cached_property
     def sqlalchemy_database_url(self) -> PostgresDsn:
         """
         Sets up a db connection URL for both SQLAlchemy and Alembic.
         Removes libpq-specific params like 'channel_binding' and 'sslmode'
         that break asyncpg.
         """
-        url = str(self.database_url)
-        url = re.sub(r"^postgresql:", "postgresql+asyncpg:", url)
-        url = url.replace("sslmode=require", "ssl=require")
-        url = re.sub(r"[?&]channel_binding=[^&]*", "", url)
+        url = _DSN_RE.sub(
+            lambda m: _DSN_REPLACEMENTS.get(m.group(0), ""), str(self.database_url)
+        )
 
         return PostgresDsn(url)
 
@@ -51,20 +70,30 @@ class Settings(BaseSettings):
     cors_origins: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = []
 
     @computed_field
-    @property
-    def all_cors_origins(self) -> list[str]:
-        return [str(origin).rstrip("/") for origin in self.cors_origins]
+    @cached_property
+    def all_cors_origins(self) -> tuple[str, ...]:
+        return tuple(str(origin).rstrip("/") for origin in self.cors_origins)
 
     # Auth
     secret_key: SecretStr
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     refresh_token_expire_minutes: int = 60 * 24 * 7  # 7 Days
+    refresh_token_purge_interval_minutes: int = 5
 
     # Admin
     first_admin: str
     first_admin_email: EmailStr
     first_admin_password: SecretStr
 
+    @field_validator("first_admin")
+    @classmethod
+    def normalize_first_admin(cls, v: str) -> str:
+        # Usernames are compared case-insensitively, store the admin canonicalized.
+        return v.lower()
+
 
-config = Settings()
+@lru_cache(maxsize=1)
+def get_config() -> Settings:
+    """Loads the settings on first use; every later call returns the same instance."""
+    return Settings()
@@ -1,11 +1,52 @@
+import asyncio
+from typing import Any
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.core.config import config
+from app.core.config import get_config
+
+config = get_config()
+
+connect_args: dict[str, Any] = {
+    # Server-side prepared statements kept per connection by the asyncpg dialect,
+    # enough for every statement shape so none is re-prepared after eviction.
+    "prepared_statement_cache_size": config.database_prepared_statement_cache_size,
+    # The queries are short OLTP lookups, where JIT compiling them costs more than
+    # it saves.
+    "server_settings": {"jit": "off"},
+}
+if not config.database_prepared_statement_cache_size:
+    # A transaction-pooling PgBouncer shares server connections between clients,
+    # so asyncpg's own statement cache and its per-connection statement names
+    # (__asyncpg_stmt_N__) would collide there.
+    connect_args["statement_cache_size"] = 0
+    connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
 
 engine = create_async_engine(
     str(config.sqlalchemy_database_url),
-    echo=True,
+    # Statement logging formats every query, keep it out of production.
+    echo=config.debug,
+    pool_size=config.database_pool_size,
+    max_overflow=config.database_max_overflow,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    # Room for every statement shape the routers emit, so compiled SQL is reused
+    # across requests and sessions instead of being evicted and rebuilt.
+    query_cache_size=1200,
+    connect_args=connect_args,
 )
 SessionLocal = async_sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
+
+
+async def warm_up_pool() -> None:
+    """
+    Opens the pool's persistent connections up front, so the first requests after
+    startup don't pay for connecting.
+    """
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(config.database_pool_size))
+    )
+    await asyncio.gather(*(connection.close() for connection in connections))
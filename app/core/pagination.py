@@ -0,0 +1,57 @@
+import base64
+from collections.abc import Callable, Sequence
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Query, status
+from pydantic import BaseModel
+
+_MAX_ID = 2**31 - 1
+
+
+class Page[T](BaseModel):
+    data: list[T]
+    # Pass back as `cursor` to fetch the next page, null on the last page.
+    next_cursor: str | None
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Annotated[str | None, Query()] = None) -> int | None:
+    """Returns the id the requested page starts after, `None` for the first page."""
+    if cursor is None:
+        return None
+
+    try:
+        last_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    except ValueError as err:  # binascii.Error subclasses ValueError
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from err
+
+    # Ids are int4 columns, anything larger would fail in the database instead.
+    if not (len(last_id) <= 10 and last_id.isdigit() and int(last_id) <= _MAX_ID):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+    return int(last_id)
+
+
+CursorDep = Annotated[int | None, Depends(decode_cursor)]
+
+
+def paginate[T](
+    items: Sequence[T], *, limit: int, last_id: Callable[[T], int]
+) -> Page[T]:
+    """
+    Builds a page from up to `limit + 1` items ordered by id, the extra item only
+    signals that there is a next page.
+    """
+    if len(items) <= limit:
+        return Page.model_construct(data=list(items), next_cursor=None)
+
+    data = list(items[:limit])
+
+    return Page.model_construct(data=data, next_cursor=encode_cursor(last_id(data[-1])))
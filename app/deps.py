@@ -1,13 +1,16 @@
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from dataclasses import dataclass
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, raiseload
 
+from app.core.cache import TTLCache
 from app.core.db import SessionLocal
 from app.core.security import oauth2_scheme, verify_access_token
-from app.models import User, UserRole
+from app.models import User, UserPrivate, UserRole
 
 TokenDep = Annotated[str, Depends(oauth2_scheme)]
 
@@ -20,6 +23,8 @@ async def get_session() -> AsyncGenerator[AsyncSession]:
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
 
 
+# Shared exception instances are raised with `with_traceback(None)`, otherwise each
+# raise would chain onto the previous traceback and keep its frames alive.
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Invalid authentication credentials",
@@ -27,72 +32,117 @@ credentials_exception = HTTPException(
 )
 
 
-async def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    user_id = verify_access_token(token)
-    if user_id is None:
-        raise credentials_exception
+@dataclass(frozen=True, slots=True)
+class AuthUser:
+    """The subset of a user needed to authenticate and authorize a request."""
 
-    # Validate user_id is a valid integer
-    try:
-        user_id = int(user_id)
-    except (TypeError, ValueError) as err:
-        raise credentials_exception from err
+    id: int
+    is_active: bool
+    role: UserRole
 
-    results = await session.execute(select(User).where(User.id == user_id))
-    user = results.scalars().first()
-    if not user:
-        raise credentials_exception
 
-    return user
+# Resolved users by id, so most authenticated requests skip the users lookup.
+# Drop a user's entry whenever their account changes.
+auth_user_cache: TTLCache[int, AuthUser] = TTLCache(maxsize=4096, ttl=30)
 
+# Ids of categories recently seen to exist and be active, so product writes can
+# skip the lookup. Drop a category's entry whenever it changes.
+active_category_cache: TTLCache[int, bool] = TTLCache(maxsize=1024, ttl=60)
 
-CurrentUserDep = Annotated[User, Depends(get_current_user)]
+# Responses of GET /users/me by user id. Drop a user's entry whenever their
+# account changes.
+user_profile_cache: TTLCache[int, UserPrivate] = TTLCache(maxsize=4096, ttl=60)
 
+# Built once at import; the engine's compiled cache then reuses its SQL on every call.
+_USER_AUTH_STMT = select(User.id, User.is_active, User.role).where(
+    User.id == bindparam("uid")
+)
 
-async def get_current_active_user(current_user: CurrentUserDep) -> User:
-    if not current_user.is_active:
-        raise credentials_exception
 
-    return current_user
+async def get_current_user(session: SessionDep, token: TokenDep) -> AuthUser:
+    subject = verify_access_token(token)
+    # Validate the subject is a plain integer id; the length cap keeps int() cheap.
+    if not (
+        isinstance(subject, str)
+        and len(subject) <= 20
+        and subject.isascii()
+        and subject.isdigit()
+    ):
+        raise credentials_exception.with_traceback(None)
+
+    user_id = int(subject)
+
+    auth_user = auth_user_cache.get(user_id)
+    if auth_user is None:
+        result = await session.execute(_USER_AUTH_STMT, {"uid": user_id})
+        row = result.first()
+        if not row:
+            raise credentials_exception.with_traceback(None)
+
+        auth_user = AuthUser(id=row.id, is_active=row.is_active, role=row.role)
+        auth_user_cache.set(user_id, auth_user)
 
+    return auth_user
 
-CurrentActiveUserDep = Annotated[User, Depends(get_current_active_user)]
 
+CurrentUserDep = Annotated[AuthUser, Depends(get_current_user)]
 
-async def get_current_seller(current_user: CurrentActiveUserDep) -> User:
-    if current_user.role != UserRole.seller:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only sellers can perform this action",
-        )
+
+async def get_current_active_user(current_user: CurrentUserDep) -> AuthUser:
+    if not current_user.is_active:
+        raise credentials_exception.with_traceback(None)
 
     return current_user
 
 
-CurrentActiveSellerDep = Annotated[User, Depends(get_current_seller)]
+CurrentActiveUserDep = Annotated[AuthUser, Depends(get_current_active_user)]
 
 
-async def get_current_buyer(current_user: CurrentActiveUserDep) -> User:
-    if current_user.role != UserRole.buyer:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only buyers can perform this action",
-        )
+async def get_current_active_db_user(
+    session: SessionDep, current_user: CurrentActiveUserDep
+) -> User:
+    """Loads the user row, for routes that read or modify the account itself."""
+    # The password hash is only ever written here, never read back.
+    user = await session.get(
+        User, current_user.id, options=[defer(User.password_hash), raiseload("*")]
+    )
+    if not user or not user.is_active:
+        raise credentials_exception.with_traceback(None)
 
-    return current_user
+    return user
 
 
-CurrentActiveBuyerDep = Annotated[User, Depends(get_current_buyer)]
+CurrentActiveDbUserDep = Annotated[User, Depends(get_current_active_db_user)]
 
 
-async def get_current_admin(current_user: CurrentActiveUserDep) -> User:
-    if current_user.role != UserRole.admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only admins can perform this action",
-        )
+def require_roles(*roles: UserRole) -> Callable[[AuthUser], Awaitable[AuthUser]]:
+    """Builds a dependency that only lets through users with one of the roles."""
+    allowed_roles = frozenset(roles)
+    # Built once per dependency, like credentials_exception.
+    forbidden_exception = HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=(
+            f"Only {' and '.join(f'{role}s' for role in roles)} can perform this action"
+        ),
+    )
 
-    return current_user
+    async def get_current_user_with_role(
+        current_user: CurrentActiveUserDep,
+    ) -> AuthUser:
+        if current_user.role not in allowed_roles:
+            raise forbidden_exception.with_traceback(None)
+
+        return current_user
+
+    return get_current_user_with_role
 
 
-CurrenActivetAdminDep = Annotated[User, Depends(get_current_admin)]
+CurrentActiveSellerDep = Annotated[AuthUser, Depends(require_roles(UserRole.seller))]
+CurrentActiveBuyerDep = Annotated[AuthUser, Depends(require_roles(UserRole.buyer))]
+CurrentActiveAdminDep = Annotated[AuthUser, Depends(require_roles(UserRole.admin))]
+CurrentActiveSellerOrAdminDep = Annotated[
+    AuthUser, Depends(require_roles(UserRole.seller, UserRole.admin))
+]
+CurrentActiveBuyerOrAdminDep = Annotated[
+    AuthUser, Depends(require_roles(UserRole.buyer, UserRole.admin))
+]
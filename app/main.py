@@ -1,24 +1,54 @@
+import asyncio
+import logging
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from datetime import UTC, datetime
 
 from fastapi import FastAPI
-from sqlalchemy import func, select
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete, exists, func, select
 
-from app.core.config import config
-from app.core.db import SessionLocal
+from app.core.config import get_config
+from app.core.db import SessionLocal, warm_up_pool
 from app.core.security import hash_password
-from app.models import User, UserRole
+from app.models import RefreshToken, User, UserRole
 from app.routers import auth, categories, products, reviews, users
 
+logger = logging.getLogger(__name__)
+
+
+async def purge_expired_refresh_tokens(*, interval_minutes: int) -> None:
+    """
+    Deletes every user's expired refresh tokens, then again every interval.
+    Keeps the cleanup off the /refresh request path.
+    """
+    while True:
+        try:
+            async with SessionLocal() as session:
+                await session.execute(
+                    delete(RefreshToken).where(
+                        RefreshToken.expired_at < datetime.now(tz=UTC)
+                    )
+                )
+
+                await session.commit()
+        except Exception:
+            # Database or connection errors: try again on the next round rather
+            # than stopping the purge for good.
+            logger.exception("Failed to purge expired refresh tokens")
+
+        await asyncio.sleep(interval_minutes * 60)
+
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> AsyncGenerator[None]:
+    config = get_config()
     async with SessionLocal() as session:
-        result = await session.execute(
-            select(User).where(func.lower(User.username) == config.first_admin.lower())
+        # Matches the functional index on lower(username).
+        admin_exists = await session.scalar(
+            select(exists().where(func.lower(User.username) == config.first_admin))
         )
-        admin = result.scalars().first()
-        if not admin:
+        if not admin_exists:
             session.add(
                 User(
                     username=config.first_admin,
@@ -32,25 +62,41 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None]:
 
             await session.commit()
 
+    await warm_up_pool()
+
+    purge_task = asyncio.create_task(
+        purge_expired_refresh_tokens(
+            interval_minutes=config.refresh_token_purge_interval_minutes
+        )
+    )
+
     yield
 
+    purge_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await purge_task
+
 
-app = FastAPI(title="E-Commerce API", version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title="E-Commerce API",
+    version="1.0.0",
+    lifespan=lifespan,
+    # Render response bodies with orjson instead of the stdlib json module.
+    default_response_class=ORJSONResponse,
+)
 
 # Set all CORS enabled origins
-if config.all_cors_origins:
+cors_origins = get_config().all_cors_origins
+if cors_origins:
     from fastapi.middleware.cors import CORSMiddleware
 
     app.add_middleware(
         CORSMiddleware,  # ty:ignore[invalid-argument-type]
-        allow_origins=config.all_cors_origins,
+        allow_origins=cors_origins,
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
     )
 
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(categories.router)
-app.include_router(products.router)
-app.include_router(reviews.router)
+for module in (auth, users, categories, products, reviews):
+    app.include_router(module.router)
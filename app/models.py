@@ -1,27 +1,49 @@
 from __future__ import annotations
 
 import enum
-from datetime import UTC, datetime
+from datetime import datetime
 from decimal import Decimal
-from functools import partial
-from typing import Annotated, Literal
+from typing import Annotated, Any, ClassVar, Literal
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from sqlalchemy import (
-    Boolean,
     DateTime,
-    Enum,
     ForeignKey,
-    Integer,
+    Index,
+    LargeBinary,
     Numeric,
+    SmallInteger,
     String,
     Text,
+    func,
+    text,
 )
+from sqlalchemy.engine import Dialect
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.types import TypeDecorator, TypeEngine
 
 
 class Base(DeclarativeBase):
-    pass
+    # Column types implied by the Mapped[...] annotation, on top of SQLAlchemy's
+    # defaults (int -> Integer, bool -> Boolean, ...).
+    type_annotation_map: ClassVar[dict[Any, TypeEngine[Any]]] = {
+        datetime: DateTime(timezone=True),
+        Decimal: Numeric(precision=10, scale=2),
+    }
+
+
+def public_from_orm[M: BaseModel](cls: type[M], obj: object, **fields: object) -> M:
+    """
+    Builds a response model from an ORM object or row without validating it, the
+    data was validated on its way into the database. Nested models are not built
+    and have to be passed in `fields`.
+    """
+    values: dict[str, Any] = {
+        field: fields[field] if field in fields else getattr(obj, field)
+        for field in cls.model_fields
+    }
+
+    return cls.model_construct(**values)
 
 
 class UserRole(enum.StrEnum):
@@ -30,19 +52,39 @@ class UserRole(enum.StrEnum):
     buyer = "buyer"
 
 
+# Roles are stored as small integers; the API keeps using the string values.
+_ROLE_CODES = {UserRole.buyer: 1, UserRole.seller: 2, UserRole.admin: 3}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+class RoleType(TypeDecorator[UserRole]):
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(
+        self, value: UserRole | None, dialect: Dialect
+    ) -> int | None:
+        return None if value is None else _ROLE_CODES[value]
+
+    def process_result_value(
+        self, value: int | None, dialect: Dialect
+    ) -> UserRole | None:
+        return None if value is None else _CODE_ROLES[value]
+
+
 class User(Base):
     __tablename__ = "users"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
     username: Mapped[str] = mapped_column(
         String(length=50), nullable=False, unique=True
     )
     email: Mapped[str] = mapped_column(String(length=120), nullable=False, unique=True)
     password_hash: Mapped[str] = mapped_column(String(length=200), nullable=False)
-    is_active: Mapped[bool] = mapped_column(
-        Boolean, default=True, nullable=False, index=True
+    is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
+    role: Mapped[UserRole] = mapped_column(
+        RoleType(), default=UserRole.buyer, nullable=False, index=True
     )
-    role: Mapped[UserRole] = mapped_column(Enum(UserRole), nullable=False, index=True)
 
     products: Mapped[list[Product]] = relationship(
         back_populates="seller", cascade="all, delete-orphan"
@@ -54,6 +96,15 @@ class User(Base):
         back_populates="user", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Backs case-insensitive username lookups, e.g. the first admin check.
+        Index("ix_users_username_lower", func.lower(username), unique=True),
+        # Backs case-insensitive email lookups on login and signup.
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        # Backs lookups of active users by id, in place of an index on the boolean.
+        Index("ix_users_active", "id", postgresql_where=text("is_active")),
+    )
+
 
 class UserBase(BaseModel):
     username: Annotated[str, Field(min_length=3, max_length=64)]
@@ -90,17 +141,18 @@ class UserPrivate(UserPublicBase):
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    token: Mapped[str] = mapped_column(String, nullable=False, unique=True)
-    expired_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False
-    )
-    user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id"), nullable=False, index=True
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    # Only the SHA-256 digest of the token is stored, never the token itself.
+    token_sha256: Mapped[bytes] = mapped_column(
+        LargeBinary(length=32), nullable=False, unique=True
     )
+    expired_at: Mapped[datetime] = mapped_column(nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
 
     user: Mapped[User] = relationship(back_populates="refresh_tokens")
 
+    __table_args__ = (Index("ix_refresh_tokens_user_expired", "user_id", "expired_at"),)
+
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
@@ -117,13 +169,11 @@ class Token(BaseModel):
 class Category(Base):
     __tablename__ = "categories"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(length=50), nullable=False)
-    is_active: Mapped[bool] = mapped_column(
-        Boolean, default=True, nullable=False, index=True
-    )
+    is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
     parent_id: Mapped[int | None] = mapped_column(
-        Integer, ForeignKey("categories.id"), nullable=True, index=True
+        ForeignKey("categories.id"), nullable=True, index=True
     )
 
     parent: Mapped[Category | None] = relationship(
@@ -134,6 +184,11 @@ class Category(Base):
         back_populates="category", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Backs listing active categories and checking a category is active.
+        Index("ix_categories_active_id", "id", postgresql_where=text("is_active")),
+    )
+
 
 class CategoryBase(BaseModel):
     name: Annotated[str, Field(min_length=3, max_length=50)]
@@ -154,7 +209,6 @@ class CategoryPublic(CategoryBase):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
-    name: Annotated[str, Field(min_length=3, max_length=50)]
     parent_id: int | None
 
 
@@ -165,24 +219,23 @@ class CategoryPrivate(CategoryPublic):
 class Product(Base):
     __tablename__ = "products"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(length=100), nullable=False)
     description: Mapped[str | None] = mapped_column(String(length=500), nullable=True)
-    price: Mapped[Decimal] = mapped_column(
-        Numeric(precision=10, scale=2), nullable=False
-    )
+    price: Mapped[Decimal] = mapped_column(nullable=False)
     image_url: Mapped[str | None] = mapped_column(String(length=200), nullable=True)
-    stock: Mapped[int] = mapped_column(Integer, nullable=False)
-    is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    stock: Mapped[int] = mapped_column(nullable=False)
+    is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
     rating: Mapped[float] = mapped_column(
         Numeric(asdecimal=False), default=0.0, nullable=False
     )
+    # Running totals over the product's active reviews, the rating is derived from.
+    rating_sum: Mapped[int] = mapped_column(default=0, nullable=False)
+    rating_count: Mapped[int] = mapped_column(default=0, nullable=False)
     category_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("categories.id"), nullable=False, index=True
-    )
-    seller_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id"), nullable=False, index=True
+        ForeignKey("categories.id"), nullable=False
     )
+    seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
 
     category: Mapped[Category] = relationship(back_populates="products")
     seller: Mapped[User] = relationship(back_populates="products")
@@ -190,6 +243,19 @@ class Product(Base):
         back_populates="product", cascade="all, delete-orphan"
     )
 
+    # The leading columns also serve plain category_id / seller_id lookups.
+    __table_args__ = (
+        Index("ix_products_category_active_price", "category_id", "is_active", "price"),
+        Index("ix_products_seller_active", "seller_id", "is_active"),
+        # Serves the keyset pagination of a category's active products by id.
+        Index(
+            "ix_products_category_id_active",
+            "category_id",
+            "id",
+            postgresql_where=text("is_active"),
+        ),
+    )
+
 
 class ProductBase(BaseModel):
     name: Annotated[str, Field(min_length=1, max_length=100)]
@@ -233,22 +299,31 @@ class ProductPublicWithCategory(ProductPublic):
 class Review(Base):
     __tablename__ = "reviews"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
     comment: Mapped[str | None] = mapped_column(Text, nullable=True)
-    grade: Mapped[int] = mapped_column(Integer, nullable=False)
-    is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    grade: Mapped[int] = mapped_column(nullable=False)
+    is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=partial(datetime.now, tz=UTC), nullable=False
+        server_default=func.now(), nullable=False
     )
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id"), nullable=False, index=True
-    )
-    product_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("products.id"), nullable=False, index=True
+        ForeignKey("users.id"), nullable=False, index=True
     )
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False)
     reviewer: Mapped[User] = relationship(back_populates="reviews")
     product: Mapped[Product] = relationship(back_populates="reviews")
 
+    __table_args__ = (
+        Index("ix_reviews_product_created", "product_id", "created_at"),
+        # Serves the keyset pagination of a product's active reviews by id.
+        Index(
+            "ix_reviews_product_id_active",
+            "product_id",
+            "id",
+            postgresql_where=text("is_active"),
+        ),
+    )
+
 
 class ReviewBase(BaseModel):
     comment: Annotated[str | None, Field(max_length=500)] = None
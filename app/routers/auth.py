@@ -2,14 +2,16 @@ from datetime import UTC, datetime, timedelta
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import delete, func, select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import raiseload
 
-from app.core.config import config
+from app.core.config import get_config
 from app.core.security import (
     create_access_token,
     generate_secure_token,
+    hash_token,
     verify_password,
 )
 from app.deps import CurrentActiveUserDep, SessionDep
@@ -24,17 +26,20 @@ async def login_for_access_token(
     session: SessionDep,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
+    now = datetime.now(tz=UTC)
     # Look up user by email (case-insensitive)
     # Note: OAuth2PasswordRequestForm uses "username" field, but we treat it as email
-    result = await session.execute(
-        select(User).where(
-            func.lower(User.email) == form_data.username.lower(), User.is_active
-        ),
+    user = await session.scalar(
+        select(User)
+        # Fail loudly instead of lazy loading relationships nobody needs here.
+        .options(raiseload("*"))
+        .where(func.lower(User.email) == form_data.username.lower(), User.is_active),
     )
-    user = result.scalars().first()
     # Verify user exists and password is correct
     # Don't reveal which one failed (security best practice)
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await run_in_threadpool(
+        verify_password, form_data.password, user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password or user is inactive",
@@ -42,21 +47,21 @@ async def login_for_access_token(
         )
 
     # Create access token with user id as subject
-    access_token_expires = timedelta(minutes=config.access_token_expire_minutes)
+    access_token_expires = timedelta(minutes=get_config().access_token_expire_minutes)
     access_token = create_access_token(
         data={"sub": str(user.id)},
         expires_delta=access_token_expires,
     )
 
     # Create refresh token
-    refresh_token_expires = timedelta(minutes=config.refresh_token_expire_minutes)
+    refresh_token_expires = timedelta(minutes=get_config().refresh_token_expire_minutes)
     refresh_token = generate_secure_token()
 
     session.add(
         RefreshToken(
-            token=refresh_token,
+            token_sha256=hash_token(refresh_token),
             user_id=user.id,
-            expired_at=datetime.now(tz=UTC) + refresh_token_expires,
+            expired_at=now + refresh_token_expires,
         )
     )
 
@@ -71,55 +76,60 @@ async def login_for_access_token(
 async def refresh_access_token(
     *, session: SessionDep, _user: CurrentActiveUserDep, data: RefreshTokenRequest
 ) -> Token:
+    now = datetime.now(tz=UTC)
+    # Rotation: Delete used token in the same statement that looks it up.
+    # Other expired tokens are purged periodically, see app.main.
+    used_token = (
+        delete(RefreshToken)
+        .where(RefreshToken.token_sha256 == hash_token(data.refresh_token))
+        .returning(RefreshToken.user_id, RefreshToken.expired_at)
+        .cte("used_token")
+    )
     result = await session.execute(
-        select(RefreshToken)
-        .options(joinedload(RefreshToken.user))
-        .where(RefreshToken.token == data.refresh_token)
+        select(User.id, User.is_active, used_token.c.expired_at).join_from(
+            used_token, User, User.id == used_token.c.user_id
+        )
     )
-    refresh_token = result.scalars().first()
-    if not refresh_token or refresh_token.expired_at < datetime.now(tz=UTC):
+    row = result.first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token",
         )
 
-    user = refresh_token.user
-    if not user.is_active:
-        await session.delete(refresh_token)
-
+    if row.expired_at < now:
         await session.commit()
 
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User is disabled",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
         )
 
-    # Rotation: Delete used token
-    await session.delete(refresh_token)
+    if not row.is_active:
+        await session.commit()
 
-    # Clean up other expired tokens for this specific user
-    await session.execute(
-        delete(RefreshToken).where(
-            RefreshToken.user_id == user.id,
-            RefreshToken.expired_at < datetime.now(tz=UTC),
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is disabled",
         )
-    )
 
     # Create new pair
-    new_refresh_token_expires = timedelta(minutes=config.refresh_token_expire_minutes)
+    new_refresh_token_expires = timedelta(
+        minutes=get_config().refresh_token_expire_minutes
+    )
     new_refresh_token = generate_secure_token()
 
     session.add(
         RefreshToken(
-            token=new_refresh_token,
-            user_id=user.id,
-            expired_at=datetime.now(tz=UTC) + new_refresh_token_expires,
+            token_sha256=hash_token(new_refresh_token),
+            user_id=row.id,
+            expired_at=now + new_refresh_token_expires,
         )
     )
 
-    access_token_expires = timedelta(minutes=config.access_token_expire_minutes)
+    access_token_expires = timedelta(minutes=get_config().access_token_expire_minutes)
     new_access_token = create_access_token(
-        data={"sub": str(user.id)},
+        data={"sub": str(row.id)},
         expires_delta=access_token_expires,
     )
 
@@ -1,10 +1,11 @@
-from collections.abc import Sequence
 from typing import Annotated
 
 from fastapi import APIRouter, HTTPException, Query, status
-from sqlalchemy import select
+from sqlalchemy import exists, select, true, update
+from sqlalchemy.orm import aliased
 
-from app.deps import CurrenActivetAdminDep, SessionDep
+from app.core.pagination import CursorDep, Page, paginate
+from app.deps import CurrentActiveAdminDep, SessionDep, active_category_cache
 from app.models import (
     Category,
     CategoryCreate,
@@ -13,6 +14,7 @@ from app.models import (
     CategoryUpdate,
     Product,
     ProductPublic,
+    public_from_orm,
 )
 
 router = APIRouter(prefix="/categories", tags=["categories"])
@@ -20,18 +22,17 @@ router = APIRouter(prefix="/categories", tags=["categories"])
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=CategoryPrivate)
 async def create_category(
-    *, session: SessionDep, _admin: CurrenActivetAdminDep, category: CategoryCreate
-) -> Category:
+    *, session: SessionDep, _admin: CurrentActiveAdminDep, category: CategoryCreate
+) -> CategoryPrivate:
     # Our new category can be a child of another.
     # If so, ensure the partent category exists and is currently active.
     if category.parent_id is not None:
-        result = await session.execute(
-            select(Category).where(
-                Category.id == category.parent_id, Category.is_active
+        parent_exists = await session.scalar(
+            select(
+                exists().where(Category.id == category.parent_id, Category.is_active)
             )
         )
-        parent_category = result.scalars().first()
-        if not parent_category:
+        if not parent_exists:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=(
@@ -46,7 +47,7 @@ async def create_category(
     await session.commit()
     await session.refresh(db_category)
 
-    return db_category
+    return public_from_orm(CategoryPrivate, db_category)
 
 
 @router.get("", response_model=list[CategoryPublic])
@@ -55,91 +56,111 @@ async def read_categories(
     session: SessionDep,
     offset: Annotated[int, Query(ge=0)] = 0,
     limit: Annotated[int, Query(gt=0)] = 100,
-) -> Sequence[Category]:
+) -> list[CategoryPublic]:
     # Fetch top-level and nested categories that are currently active.
+    # Only the public columns are selected, no ORM objects are built.
     result = await session.execute(
-        select(Category).where(Category.is_active).offset(offset).limit(limit)
+        select(Category.id, Category.name, Category.parent_id)
+        .where(Category.is_active)
+        .offset(offset)
+        .limit(limit)
     )
-    categories = result.scalars().all()
 
-    return categories
+    return [public_from_orm(CategoryPublic, row) for row in result]
 
 
-@router.get("/{category_id}/products", response_model=list[ProductPublic])
+@router.get("/{category_id}/products", response_model=Page[ProductPublic])
 async def read_category_products(
     *,
     session: SessionDep,
     category_id: int,
-    offset: Annotated[int, Query(ge=0)] = 0,
+    after_id: CursorDep,
     limit: Annotated[int, Query(gt=0)] = 100,
-) -> Sequence[Product]:
-    result = await session.execute(
+) -> Page[ProductPublic]:
+    # One round-trip: the active category, outer joined to its page of products,
+    # so a missing category yields no rows and an empty one a single NULL product.
+    products_query = (
         select(Product)
-        .join(Product.category)
-        .where(
-            Product.category_id == category_id,
-            Category.is_active,
-            Product.is_active,
-        )
-        .offset(offset)
-        .limit(limit)
+        .where(Product.category_id == Category.id, Product.is_active)
+        .order_by(Product.id)
+        .limit(limit + 1)
+    )
+    if after_id is not None:
+        products_query = products_query.where(Product.id > after_id)
+
+    products_subquery = products_query.lateral()
+    category_product = aliased(Product, products_subquery)
+    result = await session.execute(
+        select(Category.id, category_product)
+        .outerjoin(products_subquery, true())
+        .where(Category.id == category_id, Category.is_active)
+        .order_by(category_product.id)
     )
-    products = result.scalars().all()
-    # Handle empty list as well as product's category not found or inactive.
-    if not products:
-        result = await session.execute(
-            select(Category.id).where(Category.id == category_id, Category.is_active)
+    rows = result.all()
+    # Handle product's category not found or inactive.
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=rf"Category '{category_id}' not found or inactive",
         )
-        category = result.scalars().first()
-        if not category:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=rf"Category '{category_id}' not found or inactive",
-            )
 
-    return products
+    return paginate(
+        [
+            public_from_orm(ProductPublic, product)
+            for _, product in rows
+            if product is not None
+        ],
+        limit=limit,
+        last_id=lambda product: product.id,
+    )
 
 
 @router.patch("/{category_id}", response_model=CategoryPrivate)
 async def update_category(
     *,
     session: SessionDep,
-    _admin: CurrenActivetAdminDep,
+    _admin: CurrentActiveAdminDep,
     category_id: int,
     category: CategoryUpdate,
-) -> Category:
-    # Ensure the category exists.
-    result = await session.execute(select(Category).where(Category.id == category_id))
-    db_category = result.scalars().first()
-    if not db_category:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Category '{category_id}' not found",
+) -> CategoryPrivate:
+    # Update the category in one statement, guarded by every check it has to pass:
+    # it exists and a new parent category must exist and be currently active.
+    criteria = [Category.id == category_id]
+    if category.parent_id is not None:
+        # Aliased, otherwise the subquery would correlate to the updated row.
+        parent = aliased(Category)
+        criteria.append(
+            exists().where(parent.id == category.parent_id, parent.is_active)
         )
 
-    # Our updated category can be a child of another.
-    # If so, ensure the partent category exists and is currently active.
-    if category.parent_id is not None:
-        result = await session.execute(
-            select(Category).where(
-                Category.id == category.parent_id, Category.is_active
-            )
+    # Update the category, make sure to remove unset fields.
+    values = {field: getattr(category, field) for field in category.model_fields_set}
+    if values:
+        db_category = await session.scalar(
+            update(Category).where(*criteria).values(values).returning(Category)
         )
-        parent_category = result.scalars().first()
-        if not parent_category:
+    else:
+        db_category = await session.scalar(select(Category).where(*criteria))
+
+    if not db_category:
+        # The update matched nothing: a missing category is a 404, otherwise the new
+        # parent was rejected.
+        category_exists = await session.scalar(
+            select(exists().where(Category.id == category_id))
+        )
+        if not category_exists:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=(
-                    f"Parent category '{category.parent_id}' not found or inactive"
-                ),
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Category '{category_id}' not found",
             )
 
-    # Update the category, make sure to remove unset fields.
-    update_data = category.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_category, field, value)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Parent category '{category.parent_id}' not found or inactive",
+        )
 
     await session.commit()
-    await session.refresh(db_category)
 
-    return db_category
+    active_category_cache.pop(category_id)
+
+    return public_from_orm(CategoryPrivate, db_category)
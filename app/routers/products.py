@@ -1,13 +1,27 @@
-from collections.abc import Sequence
 from typing import Annotated
 
 from fastapi import APIRouter, HTTPException, Query, status
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload, selectinload
-
-from app.deps import CurrentActiveSellerDep, CurrentActiveUserDep, SessionDep
+from sqlalchemy import (
+    bindparam,
+    exists,
+    insert,
+    literal,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.orm import contains_eager, raiseload
+
+from app.core.pagination import CursorDep, Page, paginate
+from app.deps import (
+    CurrentActiveSellerDep,
+    CurrentActiveSellerOrAdminDep,
+    SessionDep,
+    active_category_cache,
+)
 from app.models import (
     Category,
+    CategoryPublic,
     Product,
     ProductCreate,
     ProductPrivate,
@@ -16,10 +30,19 @@ from app.models import (
     Review,
     ReviewPublic,
     UserRole,
+    public_from_orm,
 )
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# An active product in an active category, with the category filled from the join.
+_READ_PRODUCT_STMT = (
+    select(Product)
+    .options(contains_eager(Product.category), raiseload("*"))
+    .join(Product.category)
+    .where(Product.id == bindparam("pid"), Product.is_active, Category.is_active)
+)
+
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=ProductPrivate)
 async def create_product(
@@ -27,59 +50,82 @@ async def create_product(
     session: SessionDep,
     seller: CurrentActiveSellerDep,
     product: ProductCreate,
-) -> Product:
-    # Ensure the assigned category exists and currently active.
-    result = await session.execute(
-        select(Category).where(Category.id == product.category_id, Category.is_active)
+) -> ProductPrivate:
+    # Insert the product only if the assigned category exists and is currently
+    # active, checked in the same statement.
+    values = product.model_dump(exclude={"category_id"})
+    result = await session.scalars(
+        insert(Product)
+        .from_select(
+            [*values, "seller_id", "category_id"],
+            select(
+                *(
+                    literal(value, Product.__table__.c[field].type)
+                    for field, value in values.items()
+                ),
+                literal(seller.id),
+                Category.id,
+            ).where(Category.id == product.category_id, Category.is_active),
+        )
+        .returning(Product)
     )
-    category = result.scalars().first()
-    if not category:
+    db_product = result.first()
+    if not db_product:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=rf"Category '{product.category_id}' not found or inactive",
         )
 
-    db_product = Product(**product.model_dump(), seller_id=seller.id)
-
-    session.add(db_product)
-
     await session.commit()
-    await session.refresh(db_product)
 
-    return db_product
+    return public_from_orm(ProductPrivate, db_product)
 
 
-@router.get("", response_model=list[ProductPublicWithCategory])
+@router.get("", response_model=Page[ProductPublicWithCategory])
 async def read_products(
     *,
     session: SessionDep,
-    offset: Annotated[int, Query(ge=0)] = 0,
+    after_id: CursorDep,
     limit: Annotated[int, Query(gt=0)] = 100,
-) -> Sequence[Product]:
+) -> Page[ProductPublicWithCategory]:
     # Fetch products and assigned categories.
     # Ensue both the product and category are currently active.
-    result = await session.execute(
+    query = (
         select(Product)
-        .options(selectinload(Product.category))
+        .join(Product.category)
+        # Fill the category from the join above, fail loudly on any other lazy load.
+        .options(contains_eager(Product.category), raiseload("*"))
         .where(Product.is_active, Category.is_active)
-        .offset(offset)
-        .limit(limit)
+        .order_by(Product.id)
+        .limit(limit + 1)
     )
-    products = result.scalars().all()
+    if after_id is not None:
+        query = query.where(Product.id > after_id)
+
+    # Stream the rows in batches, building the response items as we go instead of
+    # holding every ORM instance at once.
+    result = await session.stream_scalars(query.execution_options(yield_per=200))
+    products: list[ProductPublicWithCategory] = []
+    async for partition in result.partitions():
+        products.extend(
+            public_from_orm(
+                ProductPublicWithCategory,
+                product,
+                category=public_from_orm(CategoryPublic, product.category),
+            )
+            for product in partition
+        )
 
-    return products
+    return paginate(products, limit=limit, last_id=lambda product: product.id)
 
 
 @router.get("/{product_id}", response_model=ProductPublicWithCategory)
-async def read_product(*, session: SessionDep, product_id: int) -> Product:
+async def read_product(
+    *, session: SessionDep, product_id: int
+) -> ProductPublicWithCategory:
     # Ensure the product exists and currently active.
     # Also ensure taht the product category exists and currently active.
-    result = await session.execute(
-        select(Product)
-        .options(joinedload(Product.category))
-        .join(Product.category)
-        .where(Product.id == product_id, Product.is_active, Category.is_active)
-    )
+    result = await session.execute(_READ_PRODUCT_STMT, {"pid": product_id})
     product = result.scalars().first()
     if not product:
         raise HTTPException(
@@ -87,95 +133,117 @@ async def read_product(*, session: SessionDep, product_id: int) -> Product:
             detail=rf"Product '{product_id}' not found or belongs to inactive category",
         )
 
-    return product
+    return public_from_orm(
+        ProductPublicWithCategory,
+        product,
+        category=public_from_orm(CategoryPublic, product.category),
+    )
 
 
-@router.get("/{product_id}/reviews", response_model=list[ReviewPublic])
+@router.get("/{product_id}/reviews", response_model=Page[ReviewPublic])
 async def read_product_reviews(
     *,
     session: SessionDep,
     product_id: int,
-    offset: Annotated[int, Query(ge=0)] = 0,
+    after_id: CursorDep,
     limit: Annotated[int, Query(gt=0)] = 100,
-) -> Sequence[Review]:
-    # Fetch reviews that belong to this product.
-    result = await session.execute(
-        select(Review)
-        .join(Review.product)
-        .where(
-            Review.product_id == product_id,
-            Product.is_active,
-            Review.is_active,
+) -> Page[ReviewPublic]:
+    # One round-trip: the active product, outer joined to its page of reviews,
+    # so a missing product yields no rows and one without reviews a NULL review.
+    # Only the public columns are selected, no ORM objects are built.
+    reviews_query = (
+        select(
+            Review.id,
+            Review.comment,
+            Review.grade,
+            Review.product_id,
+            Review.created_at,
+            Review.user_id,
         )
-        .offset(offset)
-        .limit(limit)
+        .where(Review.product_id == Product.id, Review.is_active)
+        .order_by(Review.id)
+        .limit(limit + 1)
+    )
+    if after_id is not None:
+        reviews_query = reviews_query.where(Review.id > after_id)
+
+    reviews_subquery = reviews_query.lateral()
+    result = await session.execute(
+        select(Product.id.label("found_product_id"), *reviews_subquery.c)
+        .outerjoin(reviews_subquery, true())
+        .where(Product.id == product_id, Product.is_active)
+        .order_by(reviews_subquery.c.id)
     )
-    reviews = result.scalars().all()
-    # Handle empty list as well as product not found or inactive.
-    if not reviews:
-        result = await session.execute(
-            select(Product.id).where(Product.id == product_id, Product.is_active)
+    rows = result.all()
+    # Handle product not found or inactive.
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=rf"Product '{product_id}' not found or inactive",
         )
-        product = result.scalars().first()
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=rf"Product '{product_id}' not found or inactive",
-            )
 
-    return reviews
+    return paginate(
+        [public_from_orm(ReviewPublic, row) for row in rows if row.id is not None],
+        limit=limit,
+        last_id=lambda review: review.id,
+    )
 
 
 @router.patch("/{product_id}", response_model=ProductPrivate)
 async def update_product(
     *,
     session: SessionDep,
-    user: CurrentActiveUserDep,
+    user: CurrentActiveSellerOrAdminDep,
     product_id: int,
     product: ProductUpdate,
-) -> Product:
-    if user.role not in (UserRole.admin, UserRole.seller):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only sellers and admins can perform this action",
+) -> ProductPrivate:
+    # Update the product in one statement, guarded by every check it has to pass:
+    # it exists, sellers can only update their own products and a new category
+    # must exist and be currently active.
+    criteria = [Product.id == product_id]
+    if user.role is UserRole.seller:
+        criteria.append(Product.seller_id == user.id)
+    # Categories recently seen active are trusted without checking them again.
+    category_id = product.category_id
+    if category_id is not None and active_category_cache.get(category_id):
+        category_id = None
+    if category_id is not None:
+        criteria.append(exists().where(Category.id == category_id, Category.is_active))
+
+    # Update the product, make sure to remove unset fields.
+    values = {field: getattr(product, field) for field in product.model_fields_set}
+    if values:
+        db_product = await session.scalar(
+            update(Product).where(*criteria).values(values).returning(Product)
         )
+    else:
+        db_product = await session.scalar(select(Product).where(*criteria))
 
-    # Ensure the product exists.
-    result = await session.execute(select(Product).where(Product.id == product_id))
-    db_product = result.scalars().first()
     if not db_product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=rf"Product '{product_id}' not found",
+        # The update matched nothing: a missing product is a 404, someone else's
+        # product a 403, anything else means the new category was rejected.
+        seller_id = await session.scalar(
+            select(Product.seller_id).where(Product.id == product_id)
         )
-    # Check if user is seller, if so make sure product belongs to them.
-    if user.role == UserRole.seller and user.id != db_product.seller_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=r"You can only update your own products",
-        )
-
-    # Update data can include a new category.
-    # If so, ensure the category exists and is currently active.
-    if product.category_id is not None:
-        result = await session.execute(
-            select(Category).where(
-                Category.id == product.category_id, Category.is_active
+        if seller_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=rf"Product '{product_id}' not found",
             )
-        )
-        category = result.scalars().first()
-        if not category:
+        if user.role is UserRole.seller and user.id != seller_id:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=(rf"Category '{product.category_id}' not found or is inactive"),
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=r"You can only update your own products",
             )
 
-    # Update the product,, make sure to remove unset fields.
-    update_data = product.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_product, field, value)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(rf"Category '{product.category_id}' not found or is inactive"),
+        )
+
+    if category_id is not None:
+        active_category_cache.set(category_id, True)
 
     await session.commit()
-    await session.refresh(db_product)
 
-    return db_product
+    return public_from_orm(ProductPrivate, db_product)
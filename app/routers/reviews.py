@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import select, update
+from sqlalchemy import Numeric, cast, exists, insert, literal, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 from sqlalchemy.sql import func
 
-from app.deps import CurrentActiveBuyerDep, CurrentActiveUserDep, SessionDep
+from app.deps import CurrentActiveBuyerDep, CurrentActiveBuyerOrAdminDep, SessionDep
 from app.models import (
     Product,
     Review,
@@ -12,110 +13,135 @@ from app.models import (
     ReviewPublic,
     ReviewUpdate,
     UserRole,
+    public_from_orm,
 )
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
 
-async def update_product_rating(*, session: AsyncSession, product_id: int) -> None:
+async def update_product_rating(
+    *,
+    session: AsyncSession,
+    product_id: int,
+    grade_delta: int,
+    count_delta: int,
+    check_active: bool = True,
+) -> None:
     """
-    Updates the average rating for product based on each review grade.
-    Ensuring the updated product and reviews are both currently active.
+    Applies a change in the product's active reviews to its running grade sum and
+    review count, and derives the average rating from them in the same statement.
+    Ensuring the updated product is currently active, unless `check_active` is off.
+    Runs in the caller's transaction, the caller commits.
     """
-    avg_query = (
-        select(func.avg(Review.grade))
-        .where(Review.product_id == product_id, Review.is_active)
-        .scalar_subquery()
-    )
-
+    rating_sum = Product.rating_sum + grade_delta
+    rating_count = Product.rating_count + count_delta
     update_query = (
         update(Product)
-        .where(Product.id == product_id, Product.is_active)
-        .values(rating=avg_query)
-        .returning(Product.id)
+        .where(Product.id == product_id)
+        .values(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            # SET expressions all read the old row, so repeat the new totals here.
+            rating=func.coalesce(
+                cast(rating_sum, Numeric) / func.nullif(rating_count, 0), 0
+            ),
+        )
+        .returning(Product.is_active)
     )
 
     result = await session.execute(update_query)
-    updated_product_id = result.scalars().first()
+    is_active = result.scalars().first()
     # Verify if the product existed/rating was updated.
-    if not updated_product_id:
+    if check_active and not is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Product '{product_id}' not found or inactive",
         )
 
-    await session.commit()
-
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=ReviewPublic)
 async def create_review(
     *, session: SessionDep, buyer: CurrentActiveBuyerDep, review: ReviewCreate
-) -> Review:
-    # Ensure the product exists and currently active.
-    result = await session.execute(
-        select(Product).where(Product.id == review.product_id, Product.is_active)
+) -> ReviewPublic:
+    # Insert the review only if the product exists and is currently active, and the
+    # buyer has no active review for it yet, checked in the same statement.
+    values = review.model_dump(exclude={"product_id"})
+    result = await session.scalars(
+        insert(Review)
+        .from_select(
+            [*values, "user_id", "product_id"],
+            select(
+                *(
+                    literal(value, Review.__table__.c[field].type)
+                    for field, value in values.items()
+                ),
+                literal(buyer.id),
+                Product.id,
+            ).where(
+                Product.id == review.product_id,
+                Product.is_active,
+                ~exists().where(
+                    Review.user_id == buyer.id,
+                    Review.product_id == review.product_id,
+                    Review.is_active,
+                ),
+            ),
+        )
+        .returning(Review)
+        .options(raiseload("*"))
     )
-    product = result.scalars().first()
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Product '{review.product_id}' not found or inactive",
+    db_review = result.first()
+    if not db_review:
+        # Nothing was inserted: either the product is missing or inactive, or the
+        # buyer already has an active review for it.
+        product_exists = await session.scalar(
+            select(exists().where(Product.id == review.product_id, Product.is_active))
         )
+        if not product_exists:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Product '{review.product_id}' not found or inactive",
+            )
 
-    # Ensure that the buyer can only leave one review for a product.
-    result = await session.execute(
-        select(Review).where(
-            Review.user_id == buyer.id,
-            Review.product_id == product.id,
-            Review.is_active,
-        )
-    )
-    existing_review = result.scalars().first()
-    if existing_review:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Users can post only one review for the product",
         )
 
-    db_review = Review(**review.model_dump(), user_id=buyer.id)
-
-    session.add(db_review)
+    # Re-calculate the average rating for a given product, in the same transaction
+    # as the insert so the new review's grade is included.
+    await update_product_rating(
+        session=session,
+        product_id=review.product_id,
+        grade_delta=db_review.grade,
+        count_delta=1,
+    )
 
     await session.commit()
-    await session.refresh(db_review)
-
-    # Re-calculate the average rating for a given product.
-    # Ensure the new review was saved to the database, so that the it's grade is
-    # included in the average rating.
-    await update_product_rating(session=session, product_id=review.product_id)
 
-    return db_review
+    return public_from_orm(ReviewPublic, db_review)
 
 
 @router.patch("/{review_id}", response_model=ReviewPrivate)
 async def update_review(
     *,
     session: SessionDep,
-    user: CurrentActiveUserDep,
+    user: CurrentActiveBuyerOrAdminDep,
     review_id: int,
     review: ReviewUpdate,
-) -> Review:
-    if user.role not in (UserRole.admin, UserRole.buyer):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only buyers and admins can perform this action",
-        )
-
+) -> ReviewPrivate:
     # Ensure the review exists.
-    result = await session.execute(select(Review).where(Review.id == review_id))
-    db_review = result.scalars().first()
+    # Locked, so concurrent updates can't both apply a change from the same grade.
+    db_review = await session.get(
+        Review, review_id, with_for_update=True, options=[raiseload("*")]
+    )
     if not db_review:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Review {str(review_id)!r} not found",
         )
     # Check if user is buyer, if so make sure review belongs to them.
-    if user.role == UserRole.buyer and user.id != db_review.user_id:
+    if user.role is UserRole.buyer and user.id != db_review.user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Users can only delete their own reviews",
@@ -124,29 +150,47 @@ async def update_review(
     # Update data can include a new product.
     # If so, ensure the product exists and is currently active.
     if review.product_id is not None:
-        result = await session.execute(
-            select(Product).where(Product.id == review.product_id, Product.is_active)
+        product_exists = await session.scalar(
+            select(exists().where(Product.id == review.product_id, Product.is_active))
         )
-        product = result.scalars().first()
-        if not product:
+        if not product_exists:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=(rf"Product '{review.product_id}' not found or is inactive"),
             )
 
-    # Update the review, make sure to remove unset fields.
-    update_data = review.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_review, field, value)
+    # The review's contribution to its product's rating, before the update.
+    old_product_id = db_review.product_id
+    old_grade = db_review.grade if db_review.is_active else 0
+    old_count = int(db_review.is_active)
 
-    await session.commit()
-    await session.refresh(db_review)
+    # Update the review, make sure to remove unset fields.
+    for field in review.model_fields_set:
+        setattr(db_review, field, getattr(review, field))
 
     # Re-calculate the average rating for a given product.
     # The review could have been deactivated or the product it belongs to could have
-    # been changed.
-    # Ensure the updated review was saved to the database, so that the it's grade is
-    # included in the average rating.
-    await update_product_rating(session=session, product_id=db_review.product_id)
+    # been changed, then its old product loses its contribution, even when that
+    # product has been deactivated since.
+    new_grade = db_review.grade if db_review.is_active else 0
+    new_count = int(db_review.is_active)
+    if db_review.product_id != old_product_id:
+        await update_product_rating(
+            session=session,
+            product_id=old_product_id,
+            grade_delta=-old_grade,
+            count_delta=-old_count,
+            check_active=False,
+        )
+        old_grade = old_count = 0
+
+    await update_product_rating(
+        session=session,
+        product_id=db_review.product_id,
+        grade_delta=new_grade - old_grade,
+        count_delta=new_count - old_count,
+    )
+
+    await session.commit()
 
-    return db_review
+    return public_from_orm(ReviewPrivate, db_review)
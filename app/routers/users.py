@@ -1,15 +1,28 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import func, select
+from typing import Annotated
 
-from app.core.config import config
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import raiseload
+
+from app.core.config import get_config
 from app.core.security import hash_password
-from app.deps import CurrentActiveUserDep, SessionDep
+from app.deps import (
+    CurrentActiveDbUserDep,
+    CurrentActiveUserDep,
+    SessionDep,
+    auth_user_cache,
+    credentials_exception,
+    user_profile_cache,
+)
 from app.models import (
     User,
     UserCreate,
     UserPrivate,
     UserRole,
     UserUpdate,
+    public_from_orm,
 )
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -20,83 +33,133 @@ router = APIRouter(prefix="/users", tags=["users"])
     status_code=status.HTTP_201_CREATED,
     response_model=UserPrivate,
 )
-async def create_user(*, session: SessionDep, user: UserCreate) -> User:
-    result = await session.execute(
-        select(User).where(func.lower(User.username) == user.username.lower())
+async def create_user(*, session: SessionDep, user: UserCreate) -> UserPrivate:
+    username = user.username.lower()
+    email = user.email.lower()
+    # Insert unless the username or email is taken, which the unique indexes on
+    # their lowercase forms detect, so signing up is a single round trip.
+    db_user = await session.scalar(
+        insert(User)
+        .values(
+            **user.model_dump(exclude={"email", "password"}),
+            email=email,
+            password_hash=await run_in_threadpool(hash_password, user.password),
+        )
+        .on_conflict_do_nothing()
+        .returning(User)
+        .options(raiseload("*"))
     )
-    duplicate_username_user = result.scalars().first()
-    if duplicate_username_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists"
+    if not db_user:
+        # Find out which field collided, a username clash is reported first.
+        result = await session.execute(
+            select(User.username).where(
+                or_(
+                    func.lower(User.username) == username,
+                    func.lower(User.email) == email,
+                )
+            )
         )
+        if any(duplicate.lower() == username for duplicate in result.scalars()):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username already exists",
+            )
 
-    result = await session.execute(
-        select(User).where(func.lower(User.email) == user.email.lower())
-    )
-    duplicate_email_user = result.scalars().first()
-    if duplicate_email_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists"
         )
 
-    db_user = User(
-        **user.model_dump(exclude={"email", "password"}),
-        email=user.email.lower(),
-        password_hash=hash_password(user.password),
-    )
-
-    session.add(db_user)
     await session.commit()
-    await session.refresh(db_user)
 
-    return db_user
+    return public_from_orm(UserPrivate, db_user)
 
 
 @router.get("/me", response_model=UserPrivate)
-async def read_current_user(*, current_active_user: CurrentActiveUserDep) -> User:
-    return current_active_user
+async def read_current_user(
+    *,
+    session: SessionDep,
+    current_user: CurrentActiveUserDep,
+    cache_control: Annotated[str | None, Header()] = None,
+) -> UserPrivate:
+    # Each worker caches separately, so a client that just updated its profile can
+    # send `Cache-Control: no-cache` to read it fresh from the database.
+    no_cache = cache_control is not None and any(
+        directive.strip().lower() == "no-cache"
+        for directive in cache_control.split(",")
+    )
+    if no_cache:
+        user_profile_cache.pop(current_user.id)
+    profile = user_profile_cache.get(current_user.id)
+    if profile is None:
+        result = await session.execute(
+            select(User.id, User.username, User.email, User.role).where(
+                User.id == current_user.id, User.is_active
+            )
+        )
+        row = result.first()
+        if not row:
+            raise credentials_exception.with_traceback(None)
+
+        profile = public_from_orm(UserPrivate, row)
+        # An update that lands while we wait on the database stores its own fresh
+        # profile, which must win over the row we read before it committed.
+        user_profile_cache.add(current_user.id, profile)
+
+    return profile
 
 
 @router.patch("/me", response_model=UserPrivate)
 async def update_current_user(
-    *, session: SessionDep, current_user: CurrentActiveUserDep, user: UserUpdate
-) -> User:
+    *, session: SessionDep, current_user: CurrentActiveDbUserDep, user: UserUpdate
+) -> UserPrivate:
     # First admin is special and cannot be updated.
     if (
-        current_user.role == UserRole.admin
-        and current_user.username == config.first_admin
+        current_user.role is UserRole.admin
+        and current_user.username.lower() == get_config().first_admin
     ):
-        return current_user
-
-    if user.username is not None:
+        return public_from_orm(UserPrivate, current_user)
+
+    # Look for a duplicate of each field being changed in a single query, other
+    # than the user's own row, so changing only the case is allowed.
+    username = user.username.lower() if user.username is not None else None
+    email = user.email.lower() if user.email is not None else None
+    clauses = []
+    if username is not None:
+        clauses.append(func.lower(User.username) == username)
+    if email is not None:
+        clauses.append(func.lower(User.email) == email)
+    if clauses:
         result = await session.execute(
-            select(User).where(func.lower(User.username) == user.username.lower())
+            select(User.username, User.email)
+            .where(User.id != current_user.id, or_(*clauses))
+            .limit(2)
         )
-        duplicate_username_user = result.scalars().first()
-        if duplicate_username_user:
+        duplicates = result.all()
+        if any(duplicate.username.lower() == username for duplicate in duplicates):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already exists",
             )
-
-        current_user.username = user.username
-
-    if user.email is not None:
-        result = await session.execute(
-            select(User).where(func.lower(User.email) == current_user.email.lower())
-        )
-        duplicate_email_user = result.scalars().first()
-        if duplicate_email_user:
+        if duplicates:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists"
             )
 
-        current_user.email = user.email.lower()
+    if user.username is not None:
+        current_user.username = user.username
+    if email is not None:
+        current_user.email = email
 
     if user.password is not None:
-        current_user.password_hash = hash_password(user.password)
+        current_user.password_hash = await run_in_threadpool(
+            hash_password, user.password
+        )
 
     await session.commit()
     await session.refresh(current_user)
 
-    return current_user
+    auth_user_cache.pop(current_user.id)
+    profile = public_from_orm(UserPrivate, current_user)
+    user_profile_cache.set(current_user.id, profile)
+
+    return profile